@@ -0,0 +1,130 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tpMuscleSplineGeometry
+
+
+def _bruteForcePairs(points, rigIds, threshold):
+    pairs = {}
+    for i in range(len(points)):
+        for j in range(len(points)):
+            if rigIds[i] >= rigIds[j]:
+                continue
+            dist = np.linalg.norm(points[i] - points[j])
+            if dist < threshold:
+                key = (int(rigIds[i]), int(rigIds[j]))
+                pairs[key] = min(pairs.get(key, np.inf), dist)
+
+    return pairs
+
+
+def _queryPairs(index, threshold):
+    return dict(((row['rigA'], row['rigB']), row['distance']) for row in index.query(threshold))
+
+
+def _eulerXYZToMatrices(rotations):
+    matrices = []
+    for rx, ry, rz in rotations:
+        cx, sx, cy, sy, cz, sz = np.cos(rx), np.sin(rx), np.cos(ry), np.sin(ry), np.cos(rz), np.sin(rz)
+        matX = np.array([[1, 0, 0], [0, cx, sx], [0, -sx, cx]])
+        matY = np.array([[cy, 0, -sy], [0, 1, 0], [sy, 0, cy]])
+        matZ = np.array([[cz, sz, 0], [-sz, cz, 0], [0, 0, 1]])
+        matrices.append(matX.dot(matY).dot(matZ))
+
+    return np.array(matrices)
+
+
+class tpSplineSpatialIndexTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self._rigIds = np.repeat(np.arange(20), 20)
+        self._uValues = np.tile(np.linspace(0.0, 1.0, 20), 20)
+        self._points = rng.rand(400, 3) * 10.0
+        self._rng = rng
+
+    def test_query_matches_brute_force(self):
+        index = tpMuscleSplineGeometry.tpSplineSpatialIndex(self._points, self._rigIds, self._uValues, 0.5)
+        pairs = _queryPairs(index, 0.5)
+        expected = _bruteForcePairs(self._points, self._rigIds, 0.5)
+        self.assertEqual(sorted(pairs), sorted(expected))
+        for key, dist in expected.items():
+            self.assertAlmostEqual(pairs[key], dist)
+
+    def test_query_bigger_than_cell_size(self):
+        index = tpMuscleSplineGeometry.tpSplineSpatialIndex(self._points, self._rigIds, self._uValues, 0.5)
+        self.assertRaises(ValueError, index.query, 1.0)
+
+    def test_update_matches_rebuild(self):
+        points = self._points.copy()
+        index = tpMuscleSplineGeometry.tpSplineSpatialIndex(points, self._rigIds, self._uValues, 0.5)
+        for _ in range(10):
+            points = points.copy()
+            moved = self._rng.choice(len(points), 30, replace=False)
+            points[moved] += self._rng.normal(0.0, 0.7, (30, 3))
+            self.assertEqual(index.update(points), 30)
+
+            rebuilt = tpMuscleSplineGeometry.tpSplineSpatialIndex(points, self._rigIds, self._uValues, 0.5)
+            self.assertEqual(sorted(_queryPairs(index, 0.5)), sorted(_queryPairs(rebuilt, 0.5)))
+            self.assertEqual(sorted(_queryPairs(index, 0.5)), sorted(_bruteForcePairs(points, self._rigIds, 0.5)))
+
+    def test_update_without_changes(self):
+        index = tpMuscleSplineGeometry.tpSplineSpatialIndex(self._points, self._rigIds, self._uValues, 0.5)
+        self.assertEqual(index.update(self._points.copy()), 0)
+
+
+class tpMuscleSplineGeometryTest(unittest.TestCase):
+    def test_arc_length_u_values(self):
+        # The first half of the u range covers one unit and the second half covers three units
+        points = np.array([[0.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 4.0, 0.0]])
+        uValues = np.array([0.0, 0.5, 1.0])
+        result = tpMuscleSplineGeometry.arcLengthUValues(points, uValues, 5)
+        np.testing.assert_allclose(result, [0.0, 0.5, 0.5 + 1.0 / 6.0, 0.5 + 2.0 / 6.0, 1.0])
+
+    def test_arc_length_u_values_degenerate(self):
+        points = np.zeros((4, 3))
+        uValues = np.linspace(0.0, 1.0, 4)
+        np.testing.assert_allclose(tpMuscleSplineGeometry.arcLengthUValues(points, uValues, 3), [0.0, 0.5, 1.0])
+
+    def test_eval_spline_points(self):
+        positions = np.array([[0.0, 0.0, 0.0], [0.0, 2.0, 0.0], [1.0, 3.0, 0.0]])
+        axes = np.array([[0.0, 1.0, 0.0], [0.0, 1.0, 0.0], [1.0, 1.0, 0.0]])
+        points = tpMuscleSplineGeometry.evalSplinePoints(positions, axes, np.ones(3), np.array([0.0, 0.5, 1.0]))
+        np.testing.assert_allclose(points, positions, atol=1e-12)
+
+    def test_spline_length_straight(self):
+        positions = np.array([[0.0, 0.0, 0.0], [0.0, 2.0, 0.0], [0.0, 5.0, 0.0]])
+        axes = np.tile([0.0, 1.0, 0.0], (3, 1))
+        self.assertAlmostEqual(tpMuscleSplineGeometry.splineLength(positions, axes, np.ones(3)), 5.0)
+
+    def test_fit_control_frames(self):
+        rng = np.random.RandomState(1)
+        points = np.column_stack([rng.rand(200) * 0.5, rng.rand(200) * 10.0, rng.rand(200) * 0.1])
+        positions, rotations = tpMuscleSplineGeometry.fitControlFrames(points, 4)
+        self.assertEqual(positions.shape, (4, 3))
+        self.assertGreater(positions[-1, 1], positions[0, 1])
+        for rotation in rotations:
+            np.testing.assert_allclose(rotation.dot(rotation.T), np.eye(3), atol=1e-9)
+            self.assertAlmostEqual(np.linalg.det(rotation), 1.0)
+            self.assertGreater(abs(rotation[1, 1]), 0.99)
+
+    def test_fit_control_frames_two_points(self):
+        points = np.array([[0.0, 0.0, 0.0], [0.0, 0.0, 10.0]])
+        positions, rotations = tpMuscleSplineGeometry.fitControlFrames(points, 3, ordered=True)
+        np.testing.assert_allclose(positions[:, 2], [0.0, 5.0, 10.0])
+        for rotation in rotations:
+            self.assertAlmostEqual(np.linalg.det(rotation), 1.0)
+            np.testing.assert_allclose(rotation[1], [0.0, 0.0, 1.0], atol=1e-9)
+
+    def test_matrices_to_euler_xyz(self):
+        rotations = np.array([[0.1, -0.4, 0.7], [1.2, 0.3, -2.0], [0.0, 0.0, 0.0]])
+        result = tpMuscleSplineGeometry.matricesToEulerXYZ(_eulerXYZToMatrices(rotations))
+        np.testing.assert_allclose(result, rotations, atol=1e-12)
+
+
+if __name__ == '__main__':
+    unittest.main()
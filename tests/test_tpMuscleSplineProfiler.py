@@ -0,0 +1,90 @@
+import os
+import sys
+import csv
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tpMuscleSplineProfiler
+
+
+RECORDED_PROFILE = {
+    'rigs': {
+        'bicepsMuscleSpline': {
+            'nodes': ['bicepsMuscleSpline', 'bicepsCtrl1', 'bicepsCtrl2', 'bicepsDriven1'],
+            'connections': 12,
+            'samples': {'1': 0.004, '2': 0.006, '3': 0.005}
+        },
+        'tricepsMuscleSpline': {
+            'nodes': ['tricepsMuscleSpline', 'tricepsCtrl1'],
+            'connections': 5,
+            'samples': {'1': 0.001, '3': 0.003}
+        },
+        'deltoidMuscleSpline': {
+            'nodes': ['deltoidMuscleSpline'],
+            'connections': 2,
+            'samples': {}
+        }
+    }
+}
+
+
+class tpMuscleSplineProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self._tmpDir = tempfile.mkdtemp()
+        self._profilePath = os.path.join(self._tmpDir, 'profile.json')
+        with open(self._profilePath, 'w') as f:
+            json.dump(RECORDED_PROFILE, f)
+
+    def tearDown(self):
+        shutil.rmtree(self._tmpDir)
+
+    def _profile(self):
+        source = tpMuscleSplineProfiler.tpRecordedRigProfileSource(self._profilePath)
+        return dict((row['rig'], row) for row in tpMuscleSplineProfiler.profileRigs(1, 3, source))
+
+    def test_ranking(self):
+        rows = self._profile()
+        self.assertEqual(rows['bicepsMuscleSpline']['rank'], 1)
+        self.assertEqual(rows['tricepsMuscleSpline']['rank'], 2)
+        self.assertEqual(rows['deltoidMuscleSpline']['rank'], 3)
+        self.assertAlmostEqual(rows['bicepsMuscleSpline']['totalTime'], 0.015)
+        self.assertAlmostEqual(rows['bicepsMuscleSpline']['maxTime'], 0.006)
+        self.assertEqual(rows['bicepsMuscleSpline']['nodes'], 4)
+        self.assertEqual(rows['bicepsMuscleSpline']['connections'], 12)
+
+    def test_missing_frames_are_skipped(self):
+        rows = self._profile()
+        self.assertEqual(rows['tricepsMuscleSpline']['frames'], 2)
+        self.assertAlmostEqual(rows['tricepsMuscleSpline']['meanTime'], 0.002)
+        self.assertEqual(rows['deltoidMuscleSpline']['frames'], 0)
+        self.assertEqual(rows['deltoidMuscleSpline']['meanTime'], 0.0)
+
+    def test_record_round_trip(self):
+        source = tpMuscleSplineProfiler.tpRecordedRigProfileSource(RECORDED_PROFILE)
+        recordPath = os.path.join(self._tmpDir, 'record.json')
+        tpMuscleSplineProfiler.recordRigProfile(recordPath, 1, 3, source)
+        with open(recordPath, 'r') as f:
+            self.assertEqual(json.load(f), RECORDED_PROFILE)
+
+    def test_write_report(self):
+        rows = tpMuscleSplineProfiler.profileRigs(
+            1, 3, tpMuscleSplineProfiler.tpRecordedRigProfileSource(RECORDED_PROFILE))
+
+        csvPath = os.path.join(self._tmpDir, 'report.csv')
+        tpMuscleSplineProfiler.writeProfileReport(rows, csvPath)
+        with open(csvPath, 'r') as f:
+            csvRows = list(csv.DictReader(f))
+        self.assertEqual([row['rig'] for row in csvRows], [row['rig'] for row in rows])
+
+        jsonPath = os.path.join(self._tmpDir, 'report.json')
+        tpMuscleSplineProfiler.writeProfileReport(rows, jsonPath)
+        with open(jsonPath, 'r') as f:
+            self.assertEqual(json.load(f), rows)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,288 @@
+#! /usr/bin/python
+
+"""
+    File name: tpMuscleSplineGeometry.py
+    Author: Tomas Poveda - www.cgart3d.com
+    Description: NumPy geometry used by the muscle rig tools (offline spline evaluation, control placement fitting,
+    spatial index and arc length tables). It does not import Maya, so it can be tested outside of Maya
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def evalSplinePoints(positions, axes, tangentLengths, uValues):
+    """
+    Evaluates an offline approximation of a cMuscleSpline curve
+    The curve is a cubic Hermite spline going through the controls. As in the cMuscleSpline node, the tangent of
+    each control follows its Y axis and is scaled by its tangentLength (and by the length of the segment, so the
+    curve does not depend on the scale of the rig). Each segment between two controls covers the same range of u.
+    :param np.array positions: (numControls, 3) array with the world positions of the controls
+    :param np.array axes: (numControls, 3) array with the world Y axis of the controls
+    :param np.array tangentLengths: (numControls, ) array with the tangent lengths of the controls
+    :param np.array uValues: (numSamples, ) array of u values between 0 and 1
+    :return: np.array, (numSamples, 3) array of points
+    """
+
+    numSegments = len(positions) - 1
+    directions = axes / np.maximum(np.linalg.norm(axes, axis=1), 1e-12)[:, np.newaxis]
+    directions *= tangentLengths[:, np.newaxis]
+    segLengths = np.linalg.norm(np.diff(positions, axis=0), axis=1)[:, np.newaxis]
+
+    x = np.clip(np.asarray(uValues, dtype=np.float64), 0.0, 1.0) * numSegments
+    seg = np.minimum(x.astype(np.int64), numSegments - 1)
+    t = (x - seg)[:, np.newaxis]
+    t2 = t * t
+    t3 = t2 * t
+
+    return ((2.0 * t3 - 3.0 * t2 + 1.0) * positions[seg] +
+            (t3 - 2.0 * t2 + t) * directions[seg] * segLengths[seg] +
+            (-2.0 * t3 + 3.0 * t2) * positions[seg + 1] +
+            (t3 - t2) * directions[seg + 1] * segLengths[seg])
+
+
+def splineLength(positions, axes, tangentLengths, samplesPerSegment=32):
+    """
+    Returns the length of the offline approximation of a cMuscleSpline curve
+    :param np.array positions: (numControls, 3) array with the world positions of the controls
+    :param np.array axes: (numControls, 3) array with the world Y axis of the controls
+    :param np.array tangentLengths: (numControls, ) array with the tangent lengths of the controls
+    :param int samplesPerSegment: Number of samples used to integrate each segment of the curve
+    :return: float
+    """
+
+    uValues = np.linspace(0.0, 1.0, samplesPerSegment * (len(positions) - 1) + 1)
+    points = evalSplinePoints(positions, axes, tangentLengths, uValues)
+
+    return float(np.linalg.norm(np.diff(points, axis=0), axis=1).sum())
+
+
+def fitControlFrames(points, numControls, ordered=False):
+    """
+    Fits the principal axis of a muscle to the given points and returns evenly spaced control positions along it
+    with its orientation (Y axis following the muscle and Z axis following the axis with less variance)
+    :param np.array points: (numPoints, 3) array of points
+    :param int numControls: Number of controls to place
+    :param bool ordered: True if the points are ordered along the muscle. In that case, the controls are placed along
+    the polyline through the points instead of along the principal axis
+    :return: tuple(np.array, np.array), (numControls, 3) positions and (numControls, 3, 3) orientation matrices
+    """
+
+    center = points.mean(axis=0)
+    _, _, axes = np.linalg.svd(points - center, full_matrices=False)
+    mainAxis = axes[0]
+    if len(axes) > 2:
+        normalAxis = axes[2]
+    else:
+        # Not enough points to get a plane, so we use the world axis less aligned with the muscle
+        normalAxis = np.eye(3)[np.argmin(np.abs(mainAxis))]
+
+    if ordered:
+        segLengths = np.linalg.norm(np.diff(points, axis=0), axis=1)
+        arcLengths = np.concatenate([[0.0], np.cumsum(segLengths)])
+        samples = np.linspace(0.0, arcLengths[-1], numControls)
+        positions = np.column_stack([np.interp(samples, arcLengths, points[:, i]) for i in range(3)])
+        tangents = np.gradient(positions, axis=0)
+    else:
+        # Controls go from the bottom to the top of the muscle
+        if mainAxis[1] < 0.0:
+            mainAxis = -mainAxis
+        proj = (points - center).dot(mainAxis)
+        positions = center + np.linspace(proj.min(), proj.max(), numControls)[:, np.newaxis] * mainAxis
+        tangents = np.tile(mainAxis, (numControls, 1))
+
+    yAxis = tangents / np.maximum(np.linalg.norm(tangents, axis=1), 1e-12)[:, np.newaxis]
+    xAxis = np.cross(yAxis, normalAxis)
+
+    # Where the muscle follows the normal axis, the world axis less aligned with the muscle is used instead
+    degenerate = np.linalg.norm(xAxis, axis=1) < 1e-6
+    if np.any(degenerate):
+        fallbackAxis = np.eye(3)[np.argmin(np.abs(yAxis[degenerate]), axis=1)]
+        xAxis[degenerate] = np.cross(yAxis[degenerate], fallbackAxis)
+    xAxis /= np.linalg.norm(xAxis, axis=1)[:, np.newaxis]
+    zAxis = np.cross(xAxis, yAxis)
+
+    return positions, np.stack([xAxis, yAxis, zAxis], axis=1)
+
+
+def matricesToEulerXYZ(matrices):
+    """
+    Converts rotation matrices (rows are the X, Y and Z axis, as in Maya) into XYZ euler rotations
+    :param np.array matrices: (numMatrices, 3, 3) array of rotation matrices
+    :return: np.array, (numMatrices, 3) array of euler rotations in radians
+    """
+
+    rx = np.arctan2(matrices[:, 1, 2], matrices[:, 2, 2])
+    ry = np.arcsin(np.clip(-matrices[:, 0, 2], -1.0, 1.0))
+    rz = np.arctan2(matrices[:, 0, 1], matrices[:, 0, 0])
+
+    return np.column_stack([rx, ry, rz])
+
+
+class tpSplineSpatialIndex(object):
+
+    # Cell coordinates are packed in one 64 bits key (21 bits per axis)
+    _CELL_BITS = 21
+    _CELL_OFFSET = 1 << (_CELL_BITS - 1)
+
+    def __init__(self, points, rigIds, uValues, cellSize):
+        """
+        Uniform grid index of the sampled points of muscle splines used to find the splines that are too close
+        Points are hashed in cells of the given size and sorted by cell, so finding the neighbours of a point is a
+        binary search in the sorted cells
+        :param np.array points: (numPoints, 3) array of points
+        :param np.array rigIds: (numPoints, ) array with the rig index of each point
+        :param np.array uValues: (numPoints, ) array with the u value of each point
+        :param float cellSize: Size of the grid cells. Queries can only use distances up to this size
+        """
+
+        if np is None:
+            raise ImportError('tpMuscleSplineGeometry: NumPy is required to build the spatial index')
+
+        self._cellSize = float(cellSize)
+        self._points = np.array(points, dtype=np.float64).reshape(-1, 3)
+        self._rigIds = np.asarray(rigIds, dtype=np.int64)
+        self._uValues = np.asarray(uValues, dtype=np.float64)
+        self._keys = self._cellKeys(self._points)
+        self._order = np.argsort(self._keys, kind='mergesort')
+        self._sortedKeys = self._keys[self._order]
+
+        bits = self._CELL_BITS
+        self._neighbourOffsets = [(dx << (2 * bits)) + (dy << bits) + dz
+                                  for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)]
+
+    @property
+    def cellSize(self):
+        return self._cellSize
+
+    @property
+    def points(self):
+        return self._points
+
+    def _cellKeys(self, points):
+        cells = np.floor(points / self._cellSize).astype(np.int64) + self._CELL_OFFSET
+        bits = self._CELL_BITS
+
+        return (cells[:, 0] << (2 * bits)) + (cells[:, 1] << bits) + cells[:, 2]
+
+    def update(self, points, tolerance=1e-6):
+        """
+        Updates the index with new positions of the same points (for example, after changing the frame). Only the
+        cells of the points that moved are recomputed. Points that changed its cell are removed from the sorted cells
+        and inserted again in its new position, so the whole index is not sorted again
+        :param np.array points: (numPoints, 3) array of points
+        :param float tolerance: Points that moved less than this distance are not updated
+        :return: int, number of points that moved
+        """
+
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        moved = np.nonzero(np.abs(points - self._points).max(axis=1) > tolerance)[0]
+        if not len(moved):
+            return 0
+
+        self._points[moved] = points[moved]
+        keys = self._cellKeys(points[moved])
+        changed = keys != self._keys[moved]
+        if np.any(changed):
+            changed, keys = moved[changed], keys[changed]
+            self._keys[changed] = keys
+
+            removed = np.zeros(len(self._keys), dtype=bool)
+            removed[changed] = True
+            keep = ~removed[self._order]
+            order = self._order[keep]
+            sortedKeys = self._sortedKeys[keep]
+
+            newOrder = np.argsort(keys, kind='mergesort')
+            changed, keys = changed[newOrder], keys[newOrder]
+            positions = np.searchsorted(sortedKeys, keys, side='right')
+            self._order = np.insert(order, positions, changed)
+            self._sortedKeys = np.insert(sortedKeys, positions, keys)
+
+        return len(moved)
+
+    def query(self, threshold):
+        """
+        Returns the pairs of rigs that have sampled points closer than the given distance
+        :param float threshold: Minimum distance allowed between two different rigs
+        :return: list(dict), one dict per rigs pair with the rig indices (rigA < rigB), its minimum distance and the
+        u ranges of each rig that violate the distance
+        """
+
+        if threshold > self._cellSize:
+            raise ValueError('tpMuscleSplineGeometry: Query distance {0} is bigger than the index cell size {1}'.format(
+                threshold, self._cellSize))
+
+        pairsA = []
+        pairsB = []
+        for offset in self._neighbourOffsets:
+            lower = np.searchsorted(self._sortedKeys, self._keys + offset, side='left')
+            upper = np.searchsorted(self._sortedKeys, self._keys + offset, side='right')
+            counts = upper - lower
+            total = counts.sum()
+            if not total:
+                continue
+
+            # Expand each point into the list of points stored in its neighbour cell
+            idxA = np.repeat(np.arange(len(self._keys)), counts)
+            starts = np.repeat(lower - (np.cumsum(counts) - counts), counts)
+            idxB = self._order[np.arange(total) + starts]
+
+            valid = self._rigIds[idxA] < self._rigIds[idxB]
+            idxA = idxA[valid]
+            idxB = idxB[valid]
+            dist2 = ((self._points[idxA] - self._points[idxB]) ** 2).sum(axis=1)
+            close = dist2 < threshold * threshold
+            pairsA.append(idxA[close])
+            pairsB.append(idxB[close])
+
+        if not pairsA:
+            return []
+        idxA = np.concatenate(pairsA)
+        idxB = np.concatenate(pairsB)
+        if not len(idxA):
+            return []
+
+        rigA = self._rigIds[idxA]
+        rigB = self._rigIds[idxB]
+        dist = np.linalg.norm(self._points[idxA] - self._points[idxB], axis=1)
+        uA = self._uValues[idxA]
+        uB = self._uValues[idxB]
+        pairs, inverse = np.unique(np.column_stack([rigA, rigB]), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+
+        minDist = np.full(len(pairs), np.inf)
+        minUA = np.full(len(pairs), np.inf)
+        maxUA = np.full(len(pairs), -np.inf)
+        minUB = np.full(len(pairs), np.inf)
+        maxUB = np.full(len(pairs), -np.inf)
+        np.minimum.at(minDist, inverse, dist)
+        np.minimum.at(minUA, inverse, uA)
+        np.maximum.at(maxUA, inverse, uA)
+        np.minimum.at(minUB, inverse, uB)
+        np.maximum.at(maxUB, inverse, uB)
+
+        return [{'rigA': int(pairs[i, 0]), 'rigB': int(pairs[i, 1]), 'distance': float(minDist[i]),
+                 'uRangeA': (float(minUA[i]), float(maxUA[i])), 'uRangeB': (float(minUB[i]), float(maxUB[i]))}
+                for i in range(len(pairs))]
+
+
+def arcLengthUValues(points, uValues, numValues):
+    """
+    Builds the arc length to u lookup table of a sampled curve and returns the u values that split the curve in
+    segments of the same length
+    :param np.array points: (numSamples, 3) array of points of the curve
+    :param np.array uValues: (numSamples, ) array with the u value of each point (increasing)
+    :param int numValues: Number of u values to return
+    :return: np.array, (numValues, ) array of u values
+    """
+
+    arcLengths = np.concatenate([[0.0], np.cumsum(np.linalg.norm(np.diff(points, axis=0), axis=1))])
+    if numValues < 2:
+        return np.zeros(numValues)
+    if arcLengths[-1] <= 0.0:
+        return np.linspace(uValues[0], uValues[-1], numValues)
+
+    return np.interp(np.linspace(0.0, arcLengths[-1], numValues), arcLengths, uValues)
@@ -0,0 +1,191 @@
+#! /usr/bin/python
+
+"""
+    File name: tpMuscleSplineProfiler.py
+    Author: Tomas Poveda - www.cgart3d.com
+    Description: Evaluation cost profiler of the muscle rigs. It does not import Maya, so recorded profiles can be
+    ranked and exported outside of Maya
+"""
+
+import sys
+import csv
+import json
+
+
+class tpRigProfileSource(object):
+    """
+    Base data source used by profileRigs to collect the evaluation cost of the muscle rigs
+    """
+
+    def rigs(self):
+        """
+        Returns the names of the rigs to profile
+        :return: list(str)
+        """
+
+        raise NotImplementedError
+
+    def rigNodes(self, rig):
+        """
+        Returns the DG nodes that belong to the given rig
+        :param str rig: Name of the rig
+        :return: list(str)
+        """
+
+        raise NotImplementedError
+
+    def connectionCount(self, rig):
+        """
+        Returns the number of connections of the DG nodes of the given rig
+        :param str rig: Name of the rig
+        :return: int
+        """
+
+        raise NotImplementedError
+
+    def sampleFrame(self, frame):
+        """
+        Returns the evaluation time (in seconds) of each rig at the given frame. Rigs without a sample for the given
+        frame are not included
+        :param int frame: Frame to sample
+        :return: dict(str, float)
+        """
+
+        raise NotImplementedError
+
+    def begin(self):
+        """
+        Called before sampling the first frame
+        """
+
+        pass
+
+    def end(self):
+        """
+        Called after sampling the last frame
+        """
+
+        pass
+
+
+class tpRecordedRigProfileSource(tpRigProfileSource):
+    def __init__(self, data):
+        """
+        Data source that reads a recorded profile (check recordRigProfile) instead of evaluating the scene
+        :param data: Path of a recorded profile JSON file or dict with the recorded profile
+        """
+
+        if not isinstance(data, dict):
+            with open(data, 'r') as f:
+                data = json.load(f)
+        self._rigs = data['rigs']
+
+    def rigs(self):
+        return sorted(self._rigs.keys())
+
+    def rigNodes(self, rig):
+        return self._rigs[rig]['nodes']
+
+    def connectionCount(self, rig):
+        return self._rigs[rig]['connections']
+
+    def sampleFrame(self, frame):
+        return dict((rig, data['samples'][str(frame)]) for rig, data in self._rigs.items()
+                    if str(frame) in data['samples'])
+
+
+def _profileFrames(startFrame, endFrame, step=1):
+    """
+    Returns the list of frames to sample between the given start and end frames (both included)
+    :return: list(int)
+    """
+
+    return list(range(int(startFrame), int(endFrame) + 1, step))
+
+
+def recordRigProfile(filePath, startFrame, endFrame, source, step=1):
+    """
+    Records the evaluation cost of the muscle rigs into a JSON file that can be used later with
+    tpRecordedRigProfileSource
+    :param str filePath: Path of the JSON file
+    :param int startFrame: First frame to sample
+    :param int endFrame: Last frame to sample
+    :param tpRigProfileSource source: Data source to record
+    :param int step: Step between sampled frames
+    """
+
+    rigs = dict((rig, {'nodes': source.rigNodes(rig), 'connections': source.connectionCount(rig), 'samples': {}})
+                for rig in source.rigs())
+    source.begin()
+    try:
+        for frame in _profileFrames(startFrame, endFrame, step):
+            for rig, elapsed in source.sampleFrame(frame).items():
+                rigs[rig]['samples'][str(frame)] = elapsed
+    finally:
+        source.end()
+
+    with open(filePath, 'w') as f:
+        json.dump({'rigs': rigs}, f, indent=2)
+
+
+def profileRigs(startFrame, endFrame, source, step=1):
+    """
+    Plays the given frame range sampling the evaluation time of each muscle rig and returns a report ranked from
+    the most expensive rig to the cheapest one. Only the frames sampled for a rig are used to compute its times
+    :param int startFrame: First frame to sample
+    :param int endFrame: Last frame to sample
+    :param tpRigProfileSource source: Data source used to collect the evaluation cost
+    :param int step: Step between sampled frames
+    :return: list(dict), one row per rig with its rank, evaluation times (in seconds), nodes and connections count
+    """
+
+    rigs = source.rigs()
+    samples = dict((rig, []) for rig in rigs)
+    source.begin()
+    try:
+        for frame in _profileFrames(startFrame, endFrame, step):
+            for rig, elapsed in source.sampleFrame(frame).items():
+                if rig in samples:
+                    samples[rig].append(elapsed)
+    finally:
+        source.end()
+
+    rows = []
+    for rig in rigs:
+        rigSamples = samples[rig]
+        rows.append({
+            'rig': rig,
+            'totalTime': sum(rigSamples),
+            'meanTime': sum(rigSamples) / len(rigSamples) if rigSamples else 0.0,
+            'maxTime': max(rigSamples) if rigSamples else 0.0,
+            'frames': len(rigSamples),
+            'nodes': len(source.rigNodes(rig)),
+            'connections': source.connectionCount(rig)
+        })
+    rows.sort(key=lambda row: row['totalTime'], reverse=True)
+    for i, row in enumerate(rows):
+        row['rank'] = i + 1
+
+    return rows
+
+
+def writeProfileReport(rows, filePath):
+    """
+    Writes a report returned by profileRigs into a CSV file (if the file extension is .csv) or a JSON file
+    :param list(dict) rows: Report rows
+    :param str filePath: Path of the report file
+    """
+
+    if filePath.lower().endswith('.csv'):
+        fields = ['rank', 'rig', 'totalTime', 'meanTime', 'maxTime', 'frames', 'nodes', 'connections']
+        if sys.version_info[0] < 3:
+            f = open(filePath, 'wb')
+        else:
+            f = open(filePath, 'w', newline='')
+        with f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(filePath, 'w') as f:
+            json.dump(rows, f, indent=2)
@@ -6,6 +6,13 @@
     Description: Tool to create MuscleSpline setups quickly
 """
 
+import os
+import json
+import time
+import timeit
+import inspect
+import hashlib
+
 try:
     from PySide2.QtGui import *
     from PySide2.QtCore import *
@@ -17,8 +24,30 @@ except:
     from shiboken import wrapInstance
 
 import maya.OpenMayaUI as OpenMayaUI
+import maya.api.OpenMaya as OpenMaya
 import pymel.core as pm
 import maya.cmds as cmds
+import maya.mel as mel
+
+import tpMuscleSplineProfiler
+from tpMuscleSplineProfiler import tpRigProfileSource, tpRecordedRigProfileSource, writeProfileReport
+from tpMuscleSplineGeometry import evalSplinePoints, splineLength, fitControlFrames, matricesToEulerXYZ, \
+    tpSplineSpatialIndex, arcLengthUValues
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Attributes added to each control to drive the jiggle of the cMuscleSpline node
+JIGGLE_ATTRS = ['tangentLength', 'jiggle', 'jiggleX', 'jiggleY', 'jiggleZ', 'jiggleImpact', 'jiggleImpactStart',
+                'jiggleImpactStop', 'cycle', 'rest']
+
+# Name used to build the rigs stored in the build cache. It is replaced by the rig name when a cached rig is imported
+CACHE_PLACEHOLDER = 'tpMuscleSplineCacheRig'
+
+# Name tokens (separated by underscores) used to find the opposite side of a rig: (left, right)
+SIDE_TOKENS = [('L', 'R'), ('l', 'r'), ('Left', 'Right'), ('left', 'right'), ('Lf', 'Rt'), ('lf', 'rt')]
 
 # -------------------------------------------------------------------------------------------------
 
@@ -51,6 +80,53 @@ def tpUndo(fn):
     return wrapper
 
 
+def tpWithoutUndo(fn):
+    """
+    Disables the undo queue (without flushing it) while the wrapped function runs. Use @tpWithoutUndo above
+    functions that only make temporary changes to the scene or that only run commands that can not be undone (file
+    import and export). Flush the undo queue after any destructive change made by those functions
+    @param fn: function to wrap
+    @return wrapped function
+    """
+
+    def wrapper(*args, **kwargs):
+        state = cmds.undoInfo(query=True, stateWithoutFlush=True)
+        cmds.undoInfo(stateWithoutFlush=False)
+        try:
+            ret = fn(*args, **kwargs)
+        finally:
+            cmds.undoInfo(stateWithoutFlush=state)
+        return ret
+
+    return wrapper
+
+
+def _setAttrs(values):
+    """
+    Sets the given numeric attributes with a single batch of setAttr commands. As any other command, it is recorded
+    in the undo queue (use it inside a @tpUndo function to undo the whole batch in one step)
+    :param list(tuple(str, float)) values: List of (plug name, value in UI units) pairs
+    """
+
+    if not values:
+        return
+
+    mel.eval('\n'.join('setAttr "{0}" {1!r};'.format(plug, float(value)) for plug, value in values))
+
+
+def _getPlug(plugName):
+    """
+    Returns the MPlug of the given plug name
+    :param str plugName: Name of the plug (node.attribute)
+    :return: OpenMaya.MPlug
+    """
+
+    sel = OpenMaya.MSelectionList()
+    sel.add(plugName)
+
+    return sel.getPlug(0)
+
+
 def snap(source=None, target=None):
     """
     Snaps (only translation) one object (target) to another (source)
@@ -483,6 +559,23 @@ class tpMuscleSplineCtrl(object):
         elif ctrlType == 'null':
             self._ctrl = pm.group(name=ctrlName, empty=True, world=True)
 
+    @classmethod
+    def fromNodes(cls, ctrl, root, auto):
+        """
+        Returns a control object wrapping already existing control, root and auto nodes
+        :param str ctrl: Name of the control
+        :param str root: Name of the root group of the control
+        :param str auto: Name of the auto group of the control
+        :return: tpMuscleSplineCtrl
+        """
+
+        muscleCtrl = cls.__new__(cls)
+        muscleCtrl._ctrl = pm.PyNode(ctrl)
+        muscleCtrl._root = pm.PyNode(root)
+        muscleCtrl._auto = pm.PyNode(auto)
+
+        return muscleCtrl
+
     @property
     def control(self):
         return self._ctrl
@@ -517,9 +610,23 @@ class tpMuscleSplineRig(object):
             muscleSplineName='tpMuscleSpline',
             controlsGrpSuffix='controls', jointsGrpSuffix='joints',
             rootSuffix='root', autoSuffix='auto',
-            lockScale=True, lockJiggleAttributes=False):
+            lockScale=True, lockJiggleAttributes=False,
+            placement=None, orderedPlacement=False,
+            useCache=False, cache=None,
+            arcLengthDrivens=False):
+
+        """
+        Creates a muscle spline rig. Check makeSpline for the description of the build parameters
+        :param placement: Optional mesh name, list of mesh components or list of points used to place the controls
+        :param bool orderedPlacement: True if the placement points are ordered along the muscle
+        :param bool useCache: True to import the rig from the build cache instead of building it. Importing a cached
+        rig flushes the undo queue (check buildFromCache)
+        :param tpMuscleSplineBuildCache cache: Build cache to use. If None, the default build cache is used
+        :param bool arcLengthDrivens: True to space the drivens evenly along the curve (after placing the controls)
+        instead of evenly in u. The curve is sampled from the cMuscleSpline node (check respaceDrivens)
+        """
 
-        self.makeSpline(
+        buildData = dict(
             name=name,
             suffixCtrl=suffixCtrl, suffixJnt=suffixJnt, suffixGrp=suffixGrp, suffixDrv=suffixDrv,
             charSize=charSize,
@@ -534,6 +641,17 @@ class tpMuscleSplineRig(object):
             lockScale=lockScale, lockJiggleAttributes=lockJiggleAttributes
         )
 
+        if useCache:
+            self.buildFromCache(cache=cache, **buildData)
+        else:
+            self.makeSpline(**buildData)
+
+        if placement is not None:
+            placeControls({self.splineNode: placement}, ordered=orderedPlacement)
+
+        if arcLengthDrivens:
+            respaceDrivens(splineNodes=[self.splineNode])
+
     @tpUndo
     def makeSpline(self,
                    name,
@@ -621,6 +739,24 @@ class tpMuscleSplineRig(object):
         self.splineNode.pctSquash.connect(self.splineNode.outPctSquash)
         self.splineNode.pctStretch.connect(self.splineNode.outPctStretch)
 
+        # Store the build parameters in the cMuscleSpline node so the rig can be rebuilt later (mirroring, etc)
+        self.buildData = dict(
+            name=name,
+            suffixCtrl=suffixCtrl, suffixJnt=suffixJnt, suffixGrp=suffixGrp, suffixDrv=suffixDrv,
+            charSize=charSize,
+            numControls=numControls, controlType=controlType,
+            numDrivens=numDrivens, drivenType=drivenType,
+            constrainMid=constrainMid,
+            mainSetName=mainSetName,
+            rigSetSuffix=rigSetSuffix,
+            muscleSplineName=muscleSplineName,
+            controlsGrpSuffix=controlsGrpSuffix, jointsGrpSuffix=jointsGrpSuffix,
+            rootSuffix=rootSuffix, autoSuffix=autoSuffix,
+            lockScale=lockScale, lockJiggleAttributes=lockJiggleAttributes
+        )
+        pm.addAttr(self.splineNode, longName='tpBuildData', dataType='string')
+        self.splineNode.tpBuildData.set(json.dumps(self.buildData))
+
         # Create group for the controls
         self.controlsGrp = pm.group(name=baseName + '_' + muscleSplineName + '_' + controlsGrpSuffix, empty=True, world=True)
         self.controlsGrp.inheritsTransform.set(True)
@@ -685,7 +821,7 @@ class tpMuscleSplineRig(object):
             pm.addAttr(ctrl.control, longName='jiggleImpactStop', shortName='jigimpsp', defaultValue=0.001, keyable=True)
             pm.addAttr(ctrl.control, longName='cycle', shortName='cyc', minValue=1.0, defaultValue=12.0, keyable=True)
             pm.addAttr(ctrl.control, longName='rest', shortName='rst', minValue=1.0, defaultValue=24.0, keyable=True)
-            for attr in ['tangentLength', 'jiggle', 'jiggleX', 'jiggleX', 'jiggleY', 'jiggleZ', 'jiggleImpact', 'jiggleImpactStart', 'jiggleImpactStop', 'cycle', 'rest']:
+            for attr in JIGGLE_ATTRS:
                 pm.setAttr(ctrl.control +'.'+attr, lock=lockJiggleAttributes)
 
             if lockScale:
@@ -821,14 +957,1128 @@ class tpMuscleSplineRig(object):
                            force=True)
             pm.connectAttr(self.splineNode + '.outputData[' + str(i) + '].outRotate', self.drivens[i] + '.rotate', force=True)
 
-        len = self.splineNode.outLen.get()
-        self.splineNode.lenDefault.set(len)
-        self.splineNode.lenSquash.set(len * 0.5)
-        self.splineNode.lenStretch.set(len * 2.0)
+        _setRestLengths(self.splineNode, self.splineNode.outLen.get())
 
         pm.select(self.mainGrp)
 
         return self.splineNode
 
+    @tpUndo
+    def buildFromCache(self, cache=None, **buildData):
+        """
+        Makes a muscle spline rig importing a rig with the same build parameters from the build cache. If the rig is
+        not cached yet, it is built with makeSpline and stored in the cache
+        Maya can not undo file imports and exports, so only those commands run outside the undo queue. The rest of
+        the build (makeSpline, renames, connections and sets) is a normal undo step. When a cached rig is imported,
+        the undo queue is flushed on purpose, because undoing past the import would leave the scene unstable
+        Check makeSpline for the description of the build parameters
+        :param tpMuscleSplineBuildCache cache: Build cache to use. If None, the default build cache is used
+        :return: cMuscleSpline node
+        """
+
+        if cache is None:
+            cache = tpMuscleSplineBuildCache()
+
+        name = buildData['name']
+        muscleSplineName = buildData.get('muscleSplineName', 'tpMuscleSpline')
+        suffixGrp = buildData.get('suffixGrp', 'grp')
+        if pm.objExists(muscleSplineName + '_' + name) or pm.objExists(
+                                                name + '_' + muscleSplineName + '_' + suffixGrp):
+            pm.error('Muscle spline {0} already exists'.format(name + '_' + muscleSplineName))
+            return False
+
+        cachedData = dict(buildData, name=CACHE_PLACEHOLDER)
+        mainSetName = cachedData.get('mainSetName', 'setMUSCLERIGS')
+        key = cache.key(cachedData)
+        filePath = cache.get(key)
+        if filePath is None:
+            self.makeSpline(**cachedData)
+            splineNode = str(self.splineNode)
+            nodes = getRigNodes(splineNode, mainSetName) + [getRigSet(splineNode, mainSetName)]
+            cache.store(key, nodes)
+        else:
+            nodes = cache.load(filePath)
+            cmds.flushUndo()
+
+        # Build parameters are read from the cached rig, so parameters not given use the makeSpline defaults
+        objs = _renameCachedNodes(nodes, CACHE_PLACEHOLDER, name)
+        splineNode = [_getNodeName(obj) for obj in objs
+                      if OpenMaya.MFnDependencyNode(obj).typeName == 'cMuscleSpline'][0]
+        self._initFromScene(splineNode, dict(getRigBuildData(splineNode), name=name))
+
+        pm.connectAttr('time1.outTime', self.splineNode + '.inTime', force=True)
+        if not pm.objExists(mainSetName):
+            pm.sets(name=mainSetName, empty=True)
+        pm.sets(mainSetName, include=getRigSet(splineNode, mainSetName))
+
+        pm.select(self.mainGrp)
+
+        return self.splineNode
+
+    def _initFromScene(self, splineNode, buildData):
+        """
+        Initializes the attributes of the rig from the nodes of an already existing muscle spline rig. The nodes are
+        found through the hierarchy and connections of the cMuscleSpline node, not by name, so other nodes with the
+        same names do not affect it
+        :param str splineNode: Unique name of the cMuscleSpline node of the rig
+        :param dict buildData: Build parameters of the rig
+        """
+
+        self.buildData = buildData
+        self.splineNode = pm.PyNode(splineNode)
+        self.splineNodeXForm = self.splineNode.getParent()
+        self.mainGrp = self.splineNodeXForm.getParent()
+        self.splineNode.tpBuildData.set(json.dumps(buildData))
+
+        self.controls = []
+        self.consGrps = []
+        self.rootGrps = []
+        for root, auto, ctrl in getRigControlGroups(str(self.splineNode)):
+            self.controls.append(tpMuscleSplineCtrl.fromNodes(ctrl, root, auto))
+            self.rootGrps.append(self.controls[-1].root)
+            self.consGrps.append(self.controls[-1].auto)
+
+        self.drivens = [pm.PyNode(driven) for driven in getRigDrivens(str(self.splineNode))]
+        self.controlsGrp = self.rootGrps[0].getParent() if self.rootGrps else None
+        self.drivensGrp = self.drivens[0].getParent() if self.drivens else None
+
+# -------------------------------------------------------------------------------------------------
+
+def _requireNumpy():
+    """
+    Raises an error if NumPy is not available in the current Maya session
+    """
+
+    if np is None:
+        pm.error('tpMuscleSplineRig: NumPy is required for this operation but it is not available')
+
+
+def getMuscleRigSets(mainSetName='setMUSCLERIGS'):
+    """
+    Returns all the muscle rig sets registered in the main muscle set
+    :param str mainSetName: Name of the main set where the rig sets are stored
+    :return: list(str)
+    """
+
+    if not cmds.objExists(mainSetName):
+        return []
+
+    return cmds.ls(cmds.sets(mainSetName, query=True) or [], type='objectSet')
+
+
+def getMuscleSplineNodes(mainSetName='setMUSCLERIGS'):
+    """
+    Returns the cMuscleSpline nodes of all the muscle rigs registered in the main muscle set
+    :param str mainSetName: Name of the main set where the rig sets are stored
+    :return: list(str)
+    """
+
+    splineNodes = []
+    for rigSet in getMuscleRigSets(mainSetName):
+        splineNodes.extend(cmds.ls(cmds.sets(rigSet, query=True) or [], type='cMuscleSpline'))
+
+    return splineNodes
+
+
+def getRigControls(splineNode):
+    """
+    Returns the controls connected to the given cMuscleSpline node, ordered by its control data index
+    :param str splineNode: Name of the cMuscleSpline node
+    :return: list(str)
+    """
+
+    controls = []
+    for i in cmds.getAttr(splineNode + '.controlData', multiIndices=True) or []:
+        src = cmds.listConnections(splineNode + '.controlData[' + str(i) + '].insertMatrix',
+                                   source=True, destination=False) or []
+        if src:
+            controls.append(src[0])
+
+    return controls
+
+
+def getRigControlGroups(splineNode):
+    """
+    Returns the root group, auto group and control of each one of the controls of the given cMuscleSpline node
+    :param str splineNode: Name of the cMuscleSpline node
+    :return: list(tuple(str, str, str))
+    """
+
+    groups = []
+    for ctrl in getRigControls(splineNode):
+        auto = cmds.listRelatives(ctrl, parent=True)[0]
+        root = cmds.listRelatives(auto, parent=True)[0]
+        groups.append((root, auto, ctrl))
+
+    return groups
+
+
+def getRigDrivens(splineNode):
+    """
+    Returns the drivens connected to the given cMuscleSpline node, ordered by its read data index
+    :param str splineNode: Name of the cMuscleSpline node
+    :return: list(str)
+    """
+
+    drivens = []
+    for i in cmds.getAttr(splineNode + '.readData', multiIndices=True) or []:
+        src = cmds.listConnections(splineNode + '.readData[' + str(i) + '].readU', source=True, destination=False) or []
+        if src:
+            drivens.append(src[0])
+
+    return drivens
+
+
+def getRigSet(splineNode, mainSetName='setMUSCLERIGS'):
+    """
+    Returns the rig set of the given cMuscleSpline node
+    :param str splineNode: Name of the cMuscleSpline node
+    :param str mainSetName: Name of the main set where the rig sets are stored
+    :return: str
+    """
+
+    rigSets = cmds.listConnections(splineNode, type='objectSet') or []
+    mainSetMembers = getMuscleRigSets(mainSetName)
+    for rigSet in rigSets:
+        if rigSet in mainSetMembers:
+            return rigSet
+
+    return rigSets[0] if rigSets else None
+
+
+def getRigNodes(splineNode, mainSetName='setMUSCLERIGS'):
+    """
+    Returns all the nodes of the muscle rig of the given cMuscleSpline node: the members of its rig set and all their
+    DAG descendants (controls, shapes, aim groups, constraints, etc)
+    :param str splineNode: Name of the cMuscleSpline node
+    :param str mainSetName: Name of the main set where the rig sets are stored
+    :return: list(str)
+    """
+
+    rigSet = getRigSet(splineNode, mainSetName)
+    if rigSet is None:
+        return []
+    members = cmds.sets(rigSet, query=True) or []
+    if not members:
+        return []
+
+    return sorted(set(cmds.ls(members, long=True) + cmds.ls(members, dag=True, long=True)))
+
+
+def getRigBuildData(splineNode):
+    """
+    Returns the parameters used to build the muscle rig of the given cMuscleSpline node
+    :param str splineNode: Name of the cMuscleSpline node
+    :return: dict
+    """
+
+    if not cmds.attributeQuery('tpBuildData', node=splineNode, exists=True):
+        pm.error('tpMuscleSplineRig: {0} was not created with tpMuscleSplineRig'.format(splineNode))
+
+    return json.loads(cmds.getAttr(splineNode + '.tpBuildData'))
+
+
+def _getControlData(splineNode):
+    """
+    Returns the world positions (in scene units, as the cMuscleSpline outputs), world Y axis and tangent lengths of the
+    controls of the given cMuscleSpline node
+    :param str splineNode: Name of the cMuscleSpline node
+    :return: tuple(np.array, np.array, np.array)
+    """
+
+    controls = getRigControls(splineNode)
+    matrices = np.array([cmds.getAttr(ctrl + '.worldMatrix[0]') for ctrl in controls], dtype=np.float64)
+    tangentLengths = np.array([cmds.getAttr(ctrl + '.tangentLength') for ctrl in controls], dtype=np.float64)
+
+    # World matrices are returned in internal units (centimeters)
+    return matrices[:, 12:15] * OpenMaya.MDistance.internalToUI(1.0), matrices[:, 4:7], tangentLengths
+
+
+def _setRestLengths(splineNode, length, squash=0.5, stretch=2.0):
+    """
+    Sets the default, squash and stretch lengths of a cMuscleSpline node from the given rest length
+    :param str splineNode: Name of the cMuscleSpline node
+    :param float length: Rest length of the muscle spline
+    :param float squash: Ratio of the rest length used as squash length
+    :param float stretch: Ratio of the rest length used as stretch length
+    """
+
+    cmds.setAttr(splineNode + '.lenDefault', length)
+    cmds.setAttr(splineNode + '.lenSquash', length * squash)
+    cmds.setAttr(splineNode + '.lenStretch', length * stretch)
+
+
+@tpUndo
+def calibrateAll(mainSetName='setMUSCLERIGS', frame=None, squash=0.5, stretch=2.0, analytic=False, tolerance=0.01,
+                 splineNodes=None):
+    """
+    Recalibrates the rest, squash and stretch lengths of all the muscle rigs at once
+    All the lengths are read first (in one evaluation at the given frame) and then set with a single batch of setAttr
+    commands in one undo step
+    :param str mainSetName: Name of the main set where the rig sets are stored
+    :param float frame: Frame where the lengths are evaluated. If None, the current pose is used
+    :param float squash: Ratio of the rest length used as squash length
+    :param float stretch: Ratio of the rest length used as stretch length
+    :param bool analytic: True to compute the lengths from the control matrices (positions, Y axis and tangent
+    lengths) instead of reading them from the cMuscleSpline nodes (requires NumPy). The offline curve only
+    approximates the cMuscleSpline curve, so each analytic length is checked against the outLen of its node at the
+    same pose, and the outLen is used (with a warning) for the rigs where the relative error is bigger than the
+    tolerance. The calibrated lengths are always within the tolerance of outLen
+    :param float tolerance: Maximum relative error allowed between the analytic length and outLen
+    :param list(str) splineNodes: cMuscleSpline nodes to calibrate. If None, all the rigs in the main set are used
+    :return: dict(str, float), rest length of each calibrated cMuscleSpline node
+    """
+
+    if analytic:
+        _requireNumpy()
+
+    if splineNodes is None:
+        splineNodes = getMuscleSplineNodes(mainSetName)
+    if not splineNodes:
+        return {}
+
+    currentFrame = cmds.currentTime(query=True)
+    if frame is not None:
+        cmds.currentTime(frame, update=False)
+    try:
+        lengths = [cmds.getAttr(splineNode + '.outLen') for splineNode in splineNodes]
+        if analytic:
+            analyticLengths = [splineLength(*_getControlData(splineNode)) for splineNode in splineNodes]
+    finally:
+        if frame is not None:
+            cmds.currentTime(currentFrame, update=False)
+
+    if analytic:
+        invalid = []
+        for i, (length, analyticLength) in enumerate(zip(lengths, analyticLengths)):
+            if abs(analyticLength - length) <= tolerance * max(abs(length), 1e-12):
+                lengths[i] = analyticLength
+            else:
+                invalid.append(splineNodes[i])
+        if invalid:
+            pm.warning('tpMuscleSplineRig: Analytic length of {0} rigs differs more than {1:.1%} from outLen, outLen '
+                       'is used instead: {2}'.format(len(invalid), tolerance, ', '.join(invalid)))
+
+    values = []
+    for splineNode, length in zip(splineNodes, lengths):
+        for attr, ratio in [('lenDefault', 1.0), ('lenSquash', squash), ('lenStretch', stretch)]:
+            values.append((splineNode + '.' + attr, length * ratio))
+    _setAttrs(values)
+
+    return dict(zip(splineNodes, lengths))
+
+
+def mirrorName(name, sideTokens=SIDE_TOKENS):
+    """
+    Returns the name of the opposite side by swapping the side tokens separated by underscores (Char01_L_Bicep
+    becomes Char01_R_Bicep and vice versa)
+    :param str name: Name to mirror
+    :param list(tuple(str, str)) sideTokens: List of (left, right) tokens
+    :return: str, mirrored name or None if the name does not contain any side token
+    """
+
+    swap = dict(sideTokens)
+    swap.update(dict((right, left) for left, right in sideTokens))
+    parts = name.split('_')
+    mirrored = [swap.get(part, part) for part in parts]
+    if mirrored == parts:
+        return None
+
+    return '_'.join(mirrored)
+
+
+def _mirrorRigValues(sourceNode, targetNode, axis='x'):
+    """
+    Copies the control placement, jiggle settings and driven uValues of a muscle rig into another muscle rig
+    mirroring the transforms across the given world axis
+    :param str sourceNode: cMuscleSpline node of the rig to mirror
+    :param str targetNode: cMuscleSpline node of the rig that receives the mirrored values
+    :param str axis: World axis to mirror across (x or z)
+    """
+
+    axisIndex = 'xyz'.index(axis)
+
+    srcControls = getRigControlGroups(sourceNode)
+    dstControls = getRigControlGroups(targetNode)
+    srcDrivens = getRigDrivens(sourceNode)
+    dstDrivens = getRigDrivens(targetNode)
+    if len(srcControls) != len(dstControls) or len(srcDrivens) != len(dstDrivens):
+        pm.error('tpMuscleSplineRig: Impossible to mirror {0} into {1}, they have a different number of controls or '
+                 'drivens ({2}/{3} and {4}/{5})'.format(sourceNode, targetNode, len(srcControls), len(srcDrivens),
+                                                        len(dstControls), len(dstDrivens)))
+
+    # Mirroring across a plane negates the translation along the axis and the rotations around the other two
+    # axis. This is valid in local space too as long as the parent is also mirrored, so we go through the
+    # hierarchy (root > auto > control) copying local values
+    values = {}
+    for srcGroups, dstGroups in zip(srcControls, dstControls):
+        for src, dst in zip(srcGroups, dstGroups):
+            for i, axisName in enumerate('xyz'):
+                values[dst + '.t' + axisName] = cmds.getAttr(src + '.t' + axisName) * (-1 if i == axisIndex else 1)
+                values[dst + '.r' + axisName] = cmds.getAttr(src + '.r' + axisName) * (1 if i == axisIndex else -1)
+        for attr in JIGGLE_ATTRS:
+            values[dstGroups[2] + '.' + attr] = cmds.getAttr(srcGroups[2] + '.' + attr)
+
+    for srcDrv, dstDrv in zip(srcDrivens, dstDrivens):
+        values[dstDrv + '.uValue'] = cmds.getAttr(srcDrv + '.uValue')
+
+    # Locked or driven (constrained) attributes are skipped
+    for plug, value in values.items():
+        if cmds.getAttr(plug, settable=True):
+            cmds.setAttr(plug, value)
+
+
+@tpUndo
+def mirrorRig(source, axis='x', sideTokens=SIDE_TOKENS, useCache=False):
+    """
+    Creates (or updates, if it already exists) the opposite side of a muscle rig. The mirrored rig is created with the
+    build parameters stored in the source rig and receives its mirrored controls placement, jiggle settings and
+    driven uValues
+    The build parameters of the opposite side are read from the source rig, so the whole rig is built with a single
+    undo step. Optionally, both sides can go through the build cache: the rig is only built once per set of build
+    parameters and the other side (and any other rig with the same parameters) is imported from the cache
+    :param source: tpMuscleSplineRig, cMuscleSpline node name or dict with the parameters to build the source rig
+    :param str axis: World axis to mirror across (x or z)
+    :param list(tuple(str, str)) sideTokens: List of (left, right) tokens used to rename the mirrored rig
+    :param bool useCache: True to create the rigs through the build cache instead of building them. Importing a
+    cached rig flushes the undo queue (check tpMuscleSplineRig.buildFromCache)
+    :return: str, cMuscleSpline node of the mirrored rig
+    """
+
+    # Negating the rotations around the other two axis reflects the X and Z axis of the controls but not its Y axis
+    # when mirroring across Y, so the tangents of the mirrored curve would point backwards
+    if axis not in ('x', 'z'):
+        pm.error('tpMuscleSplineRig: Impossible to mirror across the {0} axis, only x and z are supported'.format(axis))
+
+    if isinstance(source, dict):
+        source = tpMuscleSplineRig(useCache=useCache, **source)
+    if isinstance(source, tpMuscleSplineRig):
+        source = source.splineNode
+    sourceNode = str(source)
+
+    buildData = getRigBuildData(sourceNode)
+    name = mirrorName(buildData['name'], sideTokens=sideTokens)
+    if name is None:
+        pm.error('tpMuscleSplineRig: Impossible to mirror {0}, its name has no side token'.format(buildData['name']))
+
+    targetNode = name + '_' + buildData['muscleSplineName'] + 'Shape'
+    if not cmds.objExists(targetNode):
+        buildData['name'] = name
+        targetNode = str(tpMuscleSplineRig(useCache=useCache, **buildData).splineNode)
+
+    _mirrorRigValues(sourceNode, targetNode, axis=axis)
+
+    return targetNode
+
+
+@tpUndo
+def mirrorAll(mainSetName='setMUSCLERIGS', axis='x', sideTokens=SIDE_TOKENS, useCache=False):
+    """
+    Mirrors all the left side muscle rigs of the main set into the right side (the left token is the first one of
+    each side tokens pair)
+    :param str mainSetName: Name of the main set where the rig sets are stored
+    :param str axis: World axis to mirror across (x or z)
+    :param list(tuple(str, str)) sideTokens: List of (left, right) tokens
+    :param bool useCache: True to create the mirrored rigs through the build cache instead of building them.
+    Importing a cached rig flushes the undo queue (check tpMuscleSplineRig.buildFromCache)
+    :return: dict(str, str), mirrored cMuscleSpline node of each source cMuscleSpline node
+    """
+
+    leftTokens = set(left for left, right in sideTokens)
+    mirrored = {}
+    for splineNode in getMuscleSplineNodes(mainSetName):
+        if not cmds.attributeQuery('tpBuildData', node=splineNode, exists=True):
+            continue
+        if not leftTokens.intersection(getRigBuildData(splineNode)['name'].split('_')):
+            continue
+        mirrored[splineNode] = mirrorRig(splineNode, axis=axis, sideTokens=sideTokens, useCache=useCache)
+
+    return mirrored
+
+
+def _getPlacementPoints(source):
+    """
+    Returns the world positions of the given placement source in Maya internal units (centimeters)
+    :param source: Mesh name, list of mesh components (vertices) or list of points (in scene units)
+    :return: np.array, (numPoints, 3) array of points
+    """
+
+    toInternal = OpenMaya.MDistance.uiToInternal(1.0)
+
+    if isinstance(source, basestring):
+        sel = OpenMaya.MSelectionList()
+        sel.add(source)
+        dagPath = sel.getDagPath(0)
+        dagPath.extendToShape()
+        points = OpenMaya.MFnMesh(dagPath).getPoints(OpenMaya.MSpace.kWorld)
+        return np.array([(pnt.x, pnt.y, pnt.z) for pnt in points], dtype=np.float64)
+
+    if len(source) and isinstance(source[0], basestring):
+        return np.array(cmds.xform(source, query=True, worldSpace=True, translation=True),
+                        dtype=np.float64).reshape(-1, 3) * toInternal
+
+    return np.asarray(source, dtype=np.float64).reshape(-1, 3) * toInternal
+
+
+@tpUndo
+def placeControls(placements, ordered=False):
+    """
+    Places the controls of the given muscle rigs along the principal axis of its placement sources
+    All the placements are computed at once and then the root groups of the controls (with the default XYZ rotate
+    order) are moved with a single batch of setAttr commands in one undo step
+    :param dict placements: Placement source of each cMuscleSpline node. A placement source can be a mesh name, a list
+    of mesh components (vertices) or a list of points
+    :param bool ordered: True if the points of the sources are ordered along the muscles
+    """
+
+    _requireNumpy()
+
+    roots = []
+    matrices = []
+    for splineNode, source in placements.items():
+        rigRoots = [groups[0] for groups in getRigControlGroups(str(splineNode))]
+        if not rigRoots:
+            continue
+        rigPositions, rigRotations = fitControlFrames(_getPlacementPoints(source), len(rigRoots), ordered=ordered)
+
+        # All the root groups of a rig share the same parent (the controls group), so world matrices are moved to
+        # local space with its inverse matrix
+        rigMatrices = np.tile(np.eye(4), (len(rigRoots), 1, 1))
+        rigMatrices[:, :3, :3] = rigRotations
+        rigMatrices[:, 3, :3] = rigPositions
+        parentInverse = OpenMaya.MFnMatrixData(_getPlug(rigRoots[0] + '.parentInverseMatrix[0]').asMObject()).matrix()
+        parentInverse = np.array([[parentInverse.getElement(r, c) for c in range(4)] for r in range(4)])
+        roots.extend(rigRoots)
+        matrices.append(np.matmul(rigMatrices, parentInverse))
+    if not roots:
+        return
+
+    matrices = np.concatenate(matrices)
+    rotations = matrices[:, :3, :3] / np.linalg.norm(matrices[:, :3, :3], axis=2)[:, :, np.newaxis]
+    values = np.column_stack([matrices[:, 3, :3] * OpenMaya.MDistance.internalToUI(1.0),
+                              matricesToEulerXYZ(rotations) * OpenMaya.MAngle.internalToUI(1.0)])
+
+    _setAttrs([(root + '.' + attr, value) for root, rootValues in zip(roots, values.tolist())
+               for attr, value in zip(['tx', 'ty', 'tz', 'rx', 'ry', 'rz'], rootValues)])
+
+
+class tpMuscleRigSnapshot(object):
+    def __init__(self, plugs, values):
+        """
+        Snapshot of the control transforms and jiggle attributes of muscle rigs. Values are stored in Maya internal
+        units (centimeters and radians) in a contiguous NumPy array
+        :param list(str) plugs: Names of the snapshot plugs
+        :param np.array values: (numPlugs, ) array with the value of each plug
+        """
+
+        self._plugs = list(plugs)
+        self._values = np.asarray(values, dtype=np.float64)
+
+    @property
+    def plugs(self):
+        return self._plugs
+
+    @property
+    def values(self):
+        return self._values
+
+    @staticmethod
+    def _getPlugs(plugNames):
+        """
+        Returns the MPlug of each one of the given plug names (None for the plugs that do not exist anymore)
+        :param list(str) plugNames: Names of the plugs
+        :return: list(OpenMaya.MPlug)
+        """
+
+        plugs = []
+        for plugName in plugNames:
+            sel = OpenMaya.MSelectionList()
+            try:
+                sel.add(plugName)
+                plugs.append(sel.getPlug(0))
+            except RuntimeError:
+                plugs.append(None)
+
+        return plugs
+
+    @classmethod
+    def capture(cls, mainSetName='setMUSCLERIGS', splineNodes=None):
+        """
+        Takes a snapshot of the controls translation, rotation and jiggle attributes of the muscle rigs. Plugs that do
+        not exist (controls without some of the jiggle attributes, etc) are skipped with a warning
+        :param str mainSetName: Name of the main set where the rig sets are stored
+        :param list(str) splineNodes: cMuscleSpline nodes to capture. If None, all the rigs in the main set are used
+        :return: tpMuscleRigSnapshot
+        """
+
+        _requireNumpy()
+
+        if splineNodes is None:
+            splineNodes = getMuscleSplineNodes(mainSetName)
+
+        attrs = ['tx', 'ty', 'tz', 'rx', 'ry', 'rz'] + JIGGLE_ATTRS
+        plugNames = [ctrl + '.' + attr for splineNode in splineNodes for ctrl in getRigControls(splineNode)
+                     for attr in attrs]
+        plugs = cls._getPlugs(plugNames)
+        skipped = [plugName for plugName, plug in zip(plugNames, plugs) if plug is None]
+        if skipped:
+            pm.warning('tpMuscleSplineRig: {0} plugs could not be captured: {1}'.format(
+                len(skipped), ', '.join(skipped[:10]) + (' ...' if len(skipped) > 10 else '')))
+            plugNames = [plugName for plugName, plug in zip(plugNames, plugs) if plug is not None]
+            plugs = [plug for plug in plugs if plug is not None]
+        values = np.fromiter((plug.asDouble() for plug in plugs), dtype=np.float64, count=len(plugs))
+
+        return cls(plugNames, values)
+
+    @classmethod
+    def load(cls, filePath):
+        """
+        Loads a snapshot from a binary file
+        :param str filePath: Path of the snapshot file
+        :return: tpMuscleRigSnapshot
+        """
+
+        _requireNumpy()
+
+        with np.load(filePath) as data:
+            return cls(data['plugs'].tolist(), data['values'])
+
+    def save(self, filePath):
+        """
+        Saves the snapshot into a binary file (NumPy .npz)
+        :param str filePath: Path of the snapshot file
+        """
+
+        with open(filePath, 'wb') as f:
+            np.savez_compressed(f, plugs=np.array(self._plugs), values=self._values)
+
+    def blend(self, other, weight=0.5):
+        """
+        Returns a new snapshot blending the values of this snapshot with the values of another one
+        Plugs that are not stored in the other snapshot keep the values of this snapshot
+        :param tpMuscleRigSnapshot other: Snapshot to blend with
+        :param float weight: Blend weight (0.0 returns this snapshot values, 1.0 returns the other snapshot values)
+        :return: tpMuscleRigSnapshot
+        """
+
+        if other.plugs == self._plugs:
+            otherValues = other.values
+        else:
+            otherIndex = dict((plug, i) for i, plug in enumerate(other.plugs))
+            indices = np.array([otherIndex.get(plug, -1) for plug in self._plugs], dtype=np.int64)
+            otherValues = np.where(indices >= 0, other.values[indices], self._values)
+
+        return tpMuscleRigSnapshot(self._plugs, self._values + (otherValues - self._values) * weight)
+
+    @staticmethod
+    def _toUIUnits(plug, value):
+        """
+        Converts a value in Maya internal units into the UI units of the given plug
+        :param OpenMaya.MPlug plug: Plug of the value
+        :param float value: Value in internal units
+        :return: float
+        """
+
+        attr = plug.attribute()
+        if attr.hasFn(OpenMaya.MFn.kUnitAttribute):
+            unitType = OpenMaya.MFnUnitAttribute(attr).unitType()
+            if unitType == OpenMaya.MFnUnitAttribute.kAngle:
+                return OpenMaya.MAngle(value).asUnits(OpenMaya.MAngle.uiUnit())
+            if unitType == OpenMaya.MFnUnitAttribute.kDistance:
+                return OpenMaya.MDistance(value).asUnits(OpenMaya.MDistance.uiUnit())
+
+        return value
+
+    @tpUndo
+    def restore(self, keyAnimated=True):
+        """
+        Restores the snapshot values into the scene in a single undo step. Free plugs are written with a single batch
+        of setAttr commands and animated plugs are keyed at the current time
+        Locked plugs, plugs driven by other nodes (constraints, expressions, etc) and missing plugs are skipped
+        :param bool keyAnimated: True to key the animated plugs. If False, animated plugs are skipped
+        :return: list(str), names of the skipped plugs
+        """
+
+        values = []
+        skipped = []
+        for plugName, plug, value in zip(self._plugs, self._getPlugs(self._plugs), self._values.tolist()):
+            if plug is None or plug.isLocked:
+                skipped.append(plugName)
+            elif not plug.isDestination:
+                values.append((plugName, self._toUIUnits(plug, value)))
+            elif keyAnimated and plug.source().node().hasFn(OpenMaya.MFn.kAnimCurve):
+                cmds.setKeyframe(plugName, value=self._toUIUnits(plug, value))
+            else:
+                skipped.append(plugName)
+        _setAttrs(values)
+
+        if skipped:
+            pm.warning('tpMuscleSplineRig: {0} snapshot plugs could not be restored: {1}'.format(
+                len(skipped), ', '.join(skipped[:10]) + (' ...' if len(skipped) > 10 else '')))
+
+        return skipped
+
+
+class tpMayaRigProfileSource(tpRigProfileSource):
+    def __init__(self, mainSetName='setMUSCLERIGS'):
+        """
+        Collects the evaluation cost of the muscle rigs of the current Maya scene. Each rig is evaluated on its own by
+        pulling the world matrices of its drivens and its outLen
+        What is timed: everything between the root groups of the controls and the drivens, this is, the controls, the
+        auto groups with the constrainMid point, aim and orient constraints, the aim groups, the aim blendColors node,
+        the cMuscleSpline node and the drivens
+        What is not timed: the parent matrices of the root groups (the rig groups and whatever drives them, like the
+        skeleton) are pulled before timing the rigs, so the upstream evaluation shared by the rigs is not added to the
+        first timed rig. The order of the rigs is also rotated each frame
+        :param str mainSetName: Name of the main set where the rig sets are stored
+        """
+
+        self._mainSetName = mainSetName
+        self._pullPlugs = list()
+        self._upstreamPlugs = list()
+        self._currentFrame = None
+        self._sampledFrames = 0
+
+    def rigs(self):
+        return getMuscleSplineNodes(self._mainSetName)
+
+    def rigNodes(self, rig):
+        return getRigNodes(rig, self._mainSetName)
+
+    def connectionCount(self, rig):
+        nodes = self.rigNodes(rig)
+        if not nodes:
+            return 0
+        conns = cmds.listConnections(nodes, connections=True, plugs=True, skipConversionNodes=False) or []
+
+        return len(set(frozenset(pair) for pair in zip(conns[::2], conns[1::2])))
+
+    def begin(self):
+        self._currentFrame = cmds.currentTime(query=True)
+        self._sampledFrames = 0
+        rigs = self.rigs()
+        self._pullPlugs = [(rig, [drv + '.worldMatrix' for drv in getRigDrivens(rig)] + [rig + '.outLen'])
+                           for rig in rigs]
+        self._upstreamPlugs = [root + '.parentMatrix' for rig in rigs for root, _, _ in getRigControlGroups(rig)]
+
+    def end(self):
+        if self._currentFrame is not None:
+            cmds.currentTime(self._currentFrame, update=True)
+
+    def sampleFrame(self, frame):
+        cmds.currentTime(frame, update=False)
+        if self._upstreamPlugs:
+            cmds.dgeval(self._upstreamPlugs)
+
+        offset = self._sampledFrames % len(self._pullPlugs) if self._pullPlugs else 0
+        self._sampledFrames += 1
+        times = dict()
+        for rig, plugs in self._pullPlugs[offset:] + self._pullPlugs[:offset]:
+            start = timeit.default_timer()
+            cmds.dgeval(plugs)
+            times[rig] = timeit.default_timer() - start
+
+        return times
+
+
+def recordRigProfile(filePath, startFrame, endFrame, step=1, source=None):
+    """
+    Records the evaluation cost of the muscle rigs into a JSON file that can be used later with
+    tpRecordedRigProfileSource (also outside of Maya, check tpMuscleSplineProfiler)
+    :param str filePath: Path of the JSON file
+    :param int startFrame: First frame to sample
+    :param int endFrame: Last frame to sample
+    :param int step: Step between sampled frames
+    :param tpRigProfileSource source: Data source to record. If None, the current Maya scene is used
+    """
+
+    if source is None:
+        source = tpMayaRigProfileSource()
+
+    tpMuscleSplineProfiler.recordRigProfile(filePath, startFrame, endFrame, source, step=step)
+
+
+def profileRigs(startFrame, endFrame, step=1, source=None):
+    """
+    Plays the given frame range sampling the evaluation time of each muscle rig and returns a report ranked from
+    the most expensive rig to the cheapest one
+    :param int startFrame: First frame to sample
+    :param int endFrame: Last frame to sample
+    :param int step: Step between sampled frames
+    :param tpRigProfileSource source: Data source used to collect the evaluation cost. If None, the current Maya scene
+    is used
+    :return: list(dict), one row per rig with its rank, evaluation times (in seconds), nodes and connections count
+    """
+
+    if source is None:
+        source = tpMayaRigProfileSource()
+
+    return tpMuscleSplineProfiler.profileRigs(startFrame, endFrame, source, step=step)
+
+
+@tpWithoutUndo
+def _sampleSplineNode(splineNode, uValues):
+    """
+    Returns the world positions (in scene units) of the given cMuscleSpline node at the given u values. The positions
+    are read from temporary readData/outputData elements, so the cMuscleSpline node itself evaluates them. All the
+    temporary u values are set with one modifier and the elements are removed with another one, and none of them is
+    added to the undo queue
+    :param str splineNode: Name of the cMuscleSpline node
+    :param list(float) uValues: List of u values between 0 and 1
+    :return: np.array, (numSamples, 3) array of points
+    """
+
+    readData = _getPlug(splineNode + '.readData')
+    outputData = _getPlug(splineNode + '.outputData')
+    nodeFn = OpenMaya.MFnDependencyNode(readData.node())
+    readU = nodeFn.attribute('readU')
+    outTranslate = nodeFn.attribute('outTranslate')
+
+    indices = readData.getExistingArrayAttributeIndices()
+    first = max(indices) + 1 if len(indices) else 0
+    tmpIndices = list(range(first, first + len(uValues)))
+
+    modifier = OpenMaya.MDGModifier()
+    for i, u in zip(tmpIndices, uValues):
+        modifier.newPlugValueDouble(readData.elementByLogicalIndex(i).child(readU), u)
+    modifier.doIt()
+    try:
+        points = []
+        for i in tmpIndices:
+            translate = outputData.elementByLogicalIndex(i).child(outTranslate)
+            points.append([translate.child(axis).asDouble() for axis in range(3)])
+    finally:
+        modifier = OpenMaya.MDGModifier()
+        outIndices = set(outputData.getExistingArrayAttributeIndices())
+        for i in tmpIndices:
+            modifier.removeMultiInstance(readData.elementByLogicalIndex(i), True)
+            if i in outIndices:
+                modifier.removeMultiInstance(outputData.elementByLogicalIndex(i), True)
+        modifier.doIt()
+
+    # Plug values are returned in internal units (centimeters)
+    return np.array(points, dtype=np.float64) * OpenMaya.MDistance.internalToUI(1.0)
+
+
+def sampleRigSplines(splineNodes, samples=32, exact=True):
+    """
+    Samples the curves of the given muscle rigs at evenly spaced u values and returns all of them in one array
+    Both sampling modes return the points in scene units
+    :param list(str) splineNodes: cMuscleSpline nodes to sample
+    :param int samples: Number of samples per rig
+    :param bool exact: True (default) to read the samples from the cMuscleSpline nodes (outputData). False evaluates
+    the curves offline from the controls, which is much faster but only approximates the cMuscleSpline node curves
+    (it is not checked against the nodes, so points can be off by a fraction of the control spacing)
+    :return: tuple(np.array, np.array, np.array), (numRigs * samples, 3) points, rig index and u value of each point
+    """
+
+    _requireNumpy()
+
+    uValues = np.linspace(0.0, 1.0, samples)
+    if exact:
+        points = [_sampleSplineNode(splineNode, uValues.tolist()) for splineNode in splineNodes]
+    else:
+        points = [evalSplinePoints(*(_getControlData(splineNode) + (uValues, ))) for splineNode in splineNodes]
+    if not points:
+        return np.zeros((0, 3)), np.zeros(0, dtype=np.int64), np.zeros(0)
+
+    return (np.concatenate(points), np.repeat(np.arange(len(splineNodes)), samples),
+            np.tile(uValues, len(splineNodes)))
+
+
+def checkSplineOverlaps(threshold, mainSetName='setMUSCLERIGS', splineNodes=None, samples=32, exact=True,
+                        index=None):
+    """
+    Finds the muscle rigs whose splines intersect or are closer than the given distance
+    To check several frames, pass the returned index back so it is updated instead of built again
+    :param float threshold: Minimum distance (in scene units) allowed between two different splines
+    :param str mainSetName: Name of the main set where the rig sets are stored
+    :param list(str) splineNodes: cMuscleSpline nodes to check. If None, all the rigs in the main set are used
+    :param int samples: Number of samples per spline. Sample spacing should be smaller than the threshold
+    :param bool exact: True (default) to sample the cMuscleSpline nodes. False evaluates the splines offline, which is
+    faster but only approximates the cMuscleSpline curves, so it can report false hits or miss real ones (check
+    sampleRigSplines)
+    :param tpSplineSpatialIndex index: Index returned by a previous check of the same splines
+    :return: tuple(list(dict), tpSplineSpatialIndex), violations (with the cMuscleSpline nodes of each pair, its
+    minimum distance and u ranges) and the index used
+    """
+
+    if splineNodes is None:
+        splineNodes = getMuscleSplineNodes(mainSetName)
+
+    points, rigIds, uValues = sampleRigSplines(splineNodes, samples=samples, exact=exact)
+    if index is None or len(index.points) != len(points) or index.cellSize < threshold:
+        index = tpSplineSpatialIndex(points, rigIds, uValues, cellSize=threshold)
+    else:
+        index.update(points)
+
+    violations = index.query(threshold)
+    for violation in violations:
+        violation['rigA'] = splineNodes[violation['rigA']]
+        violation['rigB'] = splineNodes[violation['rigB']]
+
+    return violations, index
+
+
+@tpUndo
+def respaceDrivens(mainSetName='setMUSCLERIGS', splineNodes=None, samples=64, exact=True):
+    """
+    Sets the uValue of the drivens of the muscle rigs so they are evenly spaced along its curves instead of evenly
+    spaced in u. The curves are sampled in bulk (check sampleRigSplines), all the u values are computed at once and
+    then set with a single batch of setAttr commands in one undo step
+    :param str mainSetName: Name of the main set where the rig sets are stored
+    :param list(str) splineNodes: cMuscleSpline nodes to respace. If None, all the rigs in the main set are used
+    :param int samples: Number of samples per curve used to build the arc length lookup tables
+    :param bool exact: True (default) to sample the cMuscleSpline nodes, so the lookup tables match the curves the
+    drivens follow. False evaluates the curves offline from the controls, which is faster but only approximates the
+    cMuscleSpline node curves
+    :return: dict(str, list(float)), new u values of the drivens of each cMuscleSpline node
+    """
+
+    _requireNumpy()
+
+    if splineNodes is None:
+        splineNodes = getMuscleSplineNodes(mainSetName)
+    splineNodes = [str(splineNode) for splineNode in splineNodes]
+
+    points, rigIds, uValues = sampleRigSplines(splineNodes, samples=samples, exact=exact)
+    newValues = {}
+    drivens = []
+    for i, splineNode in enumerate(splineNodes):
+        rigDrivens = getRigDrivens(splineNode)
+        rigPoints = rigIds == i
+        newValues[splineNode] = arcLengthUValues(points[rigPoints], uValues[rigPoints], len(rigDrivens)).tolist()
+        drivens.extend(zip(rigDrivens, newValues[splineNode]))
+
+    _setAttrs([(driven + '.uValue', min(max(u, 0.0), 1.0)) for driven, u in drivens])
+
+    return newValues
+
+
+_builderVersion = None
+
+
+def getBuilderVersion():
+    """
+    Returns the version of the rig builder used by the build cache. It is a hash of the source code of the functions
+    that build the rig nodes, so any change in the builder invalidates the cached rigs
+    :return: str
+    """
+
+    global _builderVersion
+    if _builderVersion is None:
+        # makeSpline is wrapped by tpUndo, so we use the source of the whole rig class
+        builder = [tpMuscleSplineCtrl, tpMuscleSplineRig, snap, _setRestLengths]
+        try:
+            source = (''.join(inspect.getsource(obj) for obj in builder) + repr(JIGGLE_ATTRS)).encode('utf-8')
+        except (IOError, TypeError):
+            # Only the compiled module is deployed, so we use the whole compiled file
+            with open(__file__, 'rb') as f:
+                source = f.read()
+        _builderVersion = hashlib.sha1(source).hexdigest()
+
+    return _builderVersion
+
+
+def _renameCachedNodes(nodes, placeholder, name):
+    """
+    Renames the nodes of a cached rig replacing the placeholder name by the rig name
+    :param list(str) nodes: Nodes to rename
+    :param str placeholder: Name used to build the cached rig
+    :param str name: Name of the rig
+    :return: list(OpenMaya.MObject), renamed nodes
+    """
+
+    sel = OpenMaya.MSelectionList()
+    for node in nodes:
+        sel.add(node)
+
+    # We keep the MObjects because the DAG paths change while the parents are renamed
+    objs = [sel.getDependNode(i) for i in range(sel.length())]
+    for obj in objs:
+        node = _getNodeName(obj)
+        shortName = node.split('|')[-1]
+        newName = shortName.replace(placeholder, name)
+        if newName != shortName:
+            cmds.rename(node, newName, ignoreShape=True)
+
+    return objs
+
+
+def _getNodeName(obj):
+    """
+    Returns the unique name of the given node (full path for DAG nodes)
+    :param OpenMaya.MObject obj: Node
+    :return: str
+    """
+
+    if obj.hasFn(OpenMaya.MFn.kDagNode):
+        return OpenMaya.MDagPath.getAPathTo(obj).fullPathName()
+
+    return OpenMaya.MFnDependencyNode(obj).name()
+
+
+class tpMuscleSplineBuildCache(object):
+
+    _NAMESPACE = 'tpMuscleSplineBuildCache'
+
+    def __init__(self, cacheDir=None, maxSize=256 * 1024 * 1024):
+        """
+        On disk cache of pre-built muscle spline rigs. Rigs with the same build parameters (all of them but the name)
+        produce the same nodes, so they are exported once as a Maya ASCII fragment and imported afterwards
+        The least recently used fragments are removed when the cache is bigger than its maximum size, and the whole
+        cache is invalidated when the rig builder changes (check getBuilderVersion)
+        :param str cacheDir: Folder where the cached rigs are stored. If None, the Maya user app folder is used
+        :param int maxSize: Maximum size of the cache in bytes
+        """
+
+        if cacheDir is None:
+            cacheDir = os.path.join(cmds.internalVar(userAppDir=True), 'tpMuscleSplineRigCache')
+
+        self._cacheDir = cacheDir
+        self._maxSize = maxSize
+
+    @property
+    def cacheDir(self):
+        return self._cacheDir
+
+    @staticmethod
+    def key(buildData):
+        """
+        Returns the cache key of the given build parameters
+        :param dict buildData: Build parameters of the rig
+        :return: str
+        """
+
+        params = dict((k, v) for k, v in buildData.items() if k != 'name')
+
+        return hashlib.sha1(json.dumps([getBuilderVersion(), params], sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _indexPath(self):
+        return os.path.join(self._cacheDir, 'index.json')
+
+    def _loadIndex(self):
+        """
+        Returns the index of the cached rigs. If the cache was created by another builder version, its rigs are removed
+        :return: dict
+        """
+
+        if os.path.isfile(self._indexPath()):
+            with open(self._indexPath(), 'r') as f:
+                index = json.load(f)
+            if index.get('version') == getBuilderVersion():
+                return index
+            for entry in index.get('entries', {}).values():
+                self._removeFile(entry['file'])
+
+        return {'version': getBuilderVersion(), 'entries': {}}
+
+    def _saveIndex(self, index):
+        with open(self._indexPath(), 'w') as f:
+            json.dump(index, f, indent=2)
+
+    def _removeFile(self, fileName):
+        filePath = os.path.join(self._cacheDir, fileName)
+        if os.path.isfile(filePath):
+            os.remove(filePath)
+
+    def _evict(self, index):
+        """
+        Removes the least recently used rigs until the cache fits in its maximum size
+        :param dict index: Index of the cached rigs
+        """
+
+        entries = index['entries']
+        totalSize = sum(entry['size'] for entry in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k]['lastUsed']):
+            if totalSize <= self._maxSize:
+                break
+            totalSize -= entries[key]['size']
+            self._removeFile(entries.pop(key)['file'])
+
+    def get(self, key):
+        """
+        Returns the file of the cached rig with the given key
+        :param str key: Cache key
+        :return: str, path of the cached rig or None if the rig is not cached
+        """
+
+        index = self._loadIndex()
+        entry = index['entries'].get(key)
+        if entry is None:
+            return None
+
+        filePath = os.path.join(self._cacheDir, entry['file'])
+        if not os.path.isfile(filePath):
+            index['entries'].pop(key)
+            self._saveIndex(index)
+            return None
+
+        entry['lastUsed'] = time.time()
+        self._saveIndex(index)
+
+        return filePath
+
+    @tpWithoutUndo
+    def store(self, key, nodes):
+        """
+        Exports the given rig nodes into the cache
+        :param str key: Cache key
+        :param list(str) nodes: Nodes of the rig (including its rig set)
+        :return: str, path of the cached rig
+        """
+
+        if not os.path.isdir(self._cacheDir):
+            os.makedirs(self._cacheDir)
+
+        fileName = key + '.ma'
+        filePath = os.path.join(self._cacheDir, fileName)
+        selection = cmds.ls(selection=True)
+        cmds.select(nodes, replace=True, noExpand=True)
+        try:
+            cmds.file(filePath, force=True, exportSelected=True, type='mayaAscii', preserveReferences=False,
+                      constructionHistory=False, channels=True, constraints=True, expressions=True, shader=False)
+        finally:
+            cmds.select(selection, replace=True, noExpand=True)
+
+        index = self._loadIndex()
+        index['entries'][key] = {'file': fileName, 'size': os.path.getsize(filePath), 'lastUsed': time.time()}
+        self._evict(index)
+        self._saveIndex(index)
+
+        return filePath
+
+    @tpWithoutUndo
+    def load(self, filePath):
+        """
+        Imports a cached rig into the scene. The import is not recorded in the undo queue, so the undo queue must be
+        flushed afterwards (check tpMuscleSplineRig.buildFromCache)
+        :param str filePath: Path of the cached rig
+        :return: list(str), imported nodes
+        """
+
+        # Nodes are imported in a temporary namespace that is merged afterwards, so imported nodes keep the names
+        # stored in the cache file instead of getting a file name prefix
+        nodes = cmds.file(filePath, i=True, type='mayaAscii', namespace=self._NAMESPACE, returnNewNodes=True,
+                          preserveReferences=False, ignoreVersion=True)
+        sel = OpenMaya.MSelectionList()
+        for node in nodes:
+            sel.add(node)
+        cmds.namespace(removeNamespace=self._NAMESPACE, mergeNamespaceWithRoot=True)
+
+        return [_getNodeName(sel.getDependNode(i)) for i in range(sel.length())]
+
+    def clear(self):
+        """
+        Removes all the cached rigs
+        """
+
+        index = self._loadIndex()
+        for entry in index['entries'].values():
+            self._removeFile(entry['file'])
+        index['entries'] = {}
+        if os.path.isdir(self._cacheDir):
+            self._saveIndex(index)
+
 def initUI():
     tpMuscleSplineRigWin().show()